@@ -7,21 +7,40 @@ Orchestrates graceful shutdown of Kubernetes nodes when UPS is running on batter
 
 import os
 import sys
+import json
 import time
+import queue
+import atexit
 import logging
+import logging.handlers
 import requests
+import threading
 import subprocess
-from datetime import datetime
-from kubernetes import client, config
+import websocket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from kubernetes import client, config, watch
+from kubernetes.client.rest import ApiException
+from requests.adapters import HTTPAdapter
 from typing import Optional
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from urllib3.util.retry import Retry
+
+# Configure logging: callers only enqueue records, a background listener
+# does the formatting and writing so a slow log consumer can't stall the loop
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logging.getLogger().addHandler(logging.handlers.QueueHandler(_log_queue))
+logging.getLogger().setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sensor states that mean the plug (and so the UPS input) is offline
+_BAD_STATES = frozenset(('unavailable', 'unknown', 'none', ''))
+
 class PowerMonitor:
     def __init__(self):
         # Home Assistant configuration
@@ -30,14 +49,28 @@ class PowerMonitor:
         self.power_sensor = os.getenv('POWER_SENSOR', 'sensor.smart_plug_power')
         self.poll_interval = int(os.getenv('POLL_INTERVAL', '15'))  # seconds
 
+        # Short-lived cache of the last REST reading, so back-to-back queries
+        # within one poll don't each hit Home Assistant
+        self._cache_ttl = max(1, self.poll_interval // 3)
+        self._power_cache: tuple = (0.0, None)  # (monotonic fetch time, state object)
+
         # Shutdown timing configuration (in seconds)
         self.shutdown_pi5_01_delay = int(os.getenv('SHUTDOWN_PI5_01_DELAY', '180'))  # 3 min
         self.shutdown_others_delay = int(os.getenv('SHUTDOWN_OTHERS_DELAY', '420'))  # 7 min
 
         # Node configuration
         self.critical_node = os.getenv('CRITICAL_NODE', 'pi4-02')  # Never shutdown
-        self.priority_shutdown_nodes = os.getenv('PRIORITY_NODES', 'pi5-01').split(',')
-        self.secondary_shutdown_nodes = os.getenv('SECONDARY_NODES', 'pi4-01,pi5-02').split(',')
+        self.priority_shutdown_nodes = self._parse_nodes(os.getenv('PRIORITY_NODES', 'pi5-01'))
+        self.secondary_shutdown_nodes = self._parse_nodes(os.getenv('SECONDARY_NODES', 'pi4-01,pi5-02'))
+        self.max_simultaneous_cordon = int(os.getenv('MAX_SIMULTANEOUS_CORDON', '2'))
+
+        self._phases = self._build_phases()
+        self._fired = set()  # Numbers of phases that completed
+        self._update_next_phase()
+
+        # Live-tunable settings from a mounted ConfigMap, re-read when it changes
+        self._cfg_path = os.getenv('CONFIG_PATH', '/etc/power-monitor/config.json')
+        self._cfg_mtime = 0.0
 
         # SSH configuration for shutdowns
         self.ssh_user = os.getenv('SSH_USER', 'jarrodservilla')
@@ -49,14 +82,67 @@ class PowerMonitor:
         self.skip_shutdown = os.getenv('SKIP_SHUTDOWN', 'false').lower() == 'true'
 
         # State tracking
-        self.power_outage_start: Optional[datetime] = None
+        # Outage timing uses the monotonic clock, immune to NTP steps and DST;
+        # the wall-clock start is kept only for logs and the state checkpoint
+        self._outage_start_mono: Optional[float] = None
+        self._outage_start_wall: Optional[datetime] = None
         self.shutdown_initiated = False
         self.nodes_shutdown = set()
+        self.nodes_cordoned = set()
+        self._state_path = os.getenv('STATE_PATH', '/var/run/power-monitor/state.json')
+        self._next_ok_log = 0.0  # Monotonic time of the next periodic "Power OK" log
+
+        # Sliding window of the last 4 readings (1 bit = power out), so a single
+        # HA restart or Zigbee blip can't start or end an outage on its own
+        self._out_bits = 0
+        self._bits_seen = 0
+        self._reading_times: list = []  # Monotonic times of the readings in the window
+        self._first_out_at: Optional[float] = None  # First "out" reading of a confirmed outage
+        self._restore_recheck = 2  # Seconds between polls while a restoration is unconfirmed
+
+        # Latest sensor state pushed over the Home Assistant WebSocket API
+        self._ws_connected = False
+        self._ws_sensor: Optional[dict] = None
+        self._ws_alive_at = 0.0  # Monotonic time of the last message (event or pong)
+        self._ws_seq = 0  # Bumped on every pushed (or seeded) state
+        self._ws_counted: tuple = (-1, 0.0)  # (push seq, monotonic time) last counted as a reading
+        self._sensor_changed = threading.Event()
+
+        # Node name -> InternalIP, refreshed at startup and after recovery
+        self._node_ip_cache: dict = {}
+
+        # Node operations within a phase run concurrently; drains are capped
+        # since each one blocks for up to 120s waiting on evictions
+        self._exec = ThreadPoolExecutor(max_workers=4, thread_name_prefix='nodeop')
+        self._drain_sem = threading.BoundedSemaphore(2)
+        self._cordon_sem = threading.BoundedSemaphore(self.max_simultaneous_cordon)
 
         # Validate configuration
         if not self.ha_token:
             logger.error("HA_TOKEN environment variable is required")
             sys.exit(1)
+        if self.max_simultaneous_cordon < 1:
+            logger.error("MAX_SIMULTANEOUS_CORDON must be at least 1")
+            sys.exit(1)
+
+        # Reuse one keep-alive HTTP session for all Home Assistant polls
+        self._state_url = f'{self.ha_url}/api/states/{self.power_sensor}'
+        self._session = requests.Session()
+        self._session.headers.update({
+            'Authorization': f'Bearer {self.ha_token}',
+            'Content-Type': 'application/json',
+        })
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=2,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        self._ws_headers = dict(self._session.headers)
+        scheme, _, host = self.ha_url.partition('://')
+        self._ws_url = f"{'wss' if scheme == 'https' else 'ws'}://{host.rstrip('/')}/api/websocket"
 
         # Initialize Kubernetes client
         try:
@@ -67,21 +153,277 @@ class PowerMonitor:
             logger.error(f"Failed to initialize Kubernetes client: {e}")
             sys.exit(1)
 
+        self._refresh_node_cache()
+        self._load_state()
+
+    def _load_state(self):
+        """Resume outage state checkpointed before a restart."""
+        try:
+            with open(self._state_path) as f:
+                state = json.load(f)
+            if not isinstance(state, dict):
+                raise ValueError(f"expected a JSON object, got {type(state).__name__}")
+            outage_start = state.get('outage_start')
+            outage_start_wall = datetime.fromisoformat(outage_start) if outage_start else None
+            if outage_start_wall and outage_start_wall.tzinfo:
+                outage_start_wall = outage_start_wall.astimezone().replace(tzinfo=None)
+            nodes_shutdown = self._load_list(state, 'nodes_shutdown', str)
+            nodes_cordoned = self._load_list(state, 'nodes_cordoned', str)
+            fired = self._load_list(state, 'fired_phases', int)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Discarding unreadable state file {self._state_path}: {e}")
+            self._reset_state()
+            return
+
+        if outage_start_wall:
+            # The monotonic clock doesn't survive a restart, so rebase it on wall-clock time
+            self._outage_start_wall = outage_start_wall
+            offline = (datetime.now() - outage_start_wall).total_seconds()
+            self._outage_start_mono = time.monotonic() - max(0.0, offline)
+        self.shutdown_initiated = bool(state.get('shutdown_initiated'))
+        self.nodes_shutdown = nodes_shutdown
+        self.nodes_cordoned = nodes_cordoned
+        self._fired = fired
+        self._update_next_phase()
+        logger.warning(f"Resumed outage state from {self._state_path}: started {outage_start}, "
+                       f"nodes shut down: {sorted(self.nodes_shutdown)}")
+
+    @staticmethod
+    def _load_list(state: dict, key: str, item_type: type) -> set:
+        """Read a list field from the state checkpoint, rejecting malformed values."""
+        value = state.get(key, [])
+        if not isinstance(value, list) or not all(isinstance(item, item_type) for item in value):
+            raise ValueError(f"{key} must be a list of {item_type.__name__}")
+        return set(value)
+
+    def _persist(self):
+        """Checkpoint outage state so a restarted monitor keeps its shutdown timeline."""
+        state = {
+            'outage_start': self._outage_start_wall.isoformat() if self._outage_start_wall else None,
+            'shutdown_initiated': self.shutdown_initiated,
+            'nodes_shutdown': sorted(self.nodes_shutdown),
+            'nodes_cordoned': sorted(self.nodes_cordoned),
+            'fired_phases': sorted(self._fired),
+        }
+        tmp_path = f'{self._state_path}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self._state_path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self._state_path)
+        except OSError as e:
+            logger.error(f"Failed to persist state to {self._state_path}: {e}")
+
+    def _reset_state(self):
+        """Clear outage state in memory and on disk."""
+        self._outage_start_mono = None
+        self._outage_start_wall = None
+        self.shutdown_initiated = False
+        self.nodes_shutdown.clear()
+        self.nodes_cordoned.clear()
+        self._fired.clear()
+        self._out_bits = 0
+        self._bits_seen = 0
+        self._reading_times = []
+        self._update_next_phase()
+        try:
+            os.remove(self._state_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to remove state file {self._state_path}: {e}")
+
+    def _build_phases(self) -> tuple:
+        """Shutdown phases as (threshold, phase, operation, nodes, description), in firing order."""
+        return tuple(sorted((
+            (30, 1, 'cordon', self.priority_shutdown_nodes, "Phase 1: Cordoning priority nodes"),
+            (60, 2, 'drain', self.priority_shutdown_nodes, "Phase 2: Draining priority nodes"),
+            (self.shutdown_pi5_01_delay, 3, 'shutdown', self.priority_shutdown_nodes, "Phase 3: Shutting down priority nodes"),
+            (300, 4, 'cordon_drain', self.secondary_shutdown_nodes, "Phase 4: Cordoning and draining secondary nodes"),
+            (self.shutdown_others_delay, 5, 'shutdown', self.secondary_shutdown_nodes, "Phase 5: Shutting down secondary nodes"),
+        ), key=lambda phase: phase[:2]))
+
+    def reload_config(self):
+        """Apply poll interval and phase delays from the config file when it changes."""
+        try:
+            mtime = os.stat(self._cfg_path).st_mtime
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            if self._cfg_mtime != -1.0:
+                logger.error(f"Failed to stat config {self._cfg_path}: {e}")
+                self._cfg_mtime = -1.0
+            return
+        if mtime == self._cfg_mtime:
+            return
+        self._cfg_mtime = mtime
+
+        try:
+            with open(self._cfg_path) as f:
+                cfg = json.load(f)
+            if not isinstance(cfg, dict):
+                raise ValueError(f"expected a JSON object, got {type(cfg).__name__}")
+            poll_interval = int(cfg.get('poll_interval', self.poll_interval))
+            priority_delay = int(cfg.get('shutdown_pi5_01_delay', self.shutdown_pi5_01_delay))
+            secondary_delay = int(cfg.get('shutdown_others_delay', self.shutdown_others_delay))
+            if min(poll_interval, priority_delay, secondary_delay) < 1:
+                raise ValueError("poll_interval and shutdown delays must be at least 1 second")
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Failed to load config from {self._cfg_path}, keeping current settings: {e}")
+            return
+
+        if (poll_interval, priority_delay, secondary_delay) == (
+                self.poll_interval, self.shutdown_pi5_01_delay, self.shutdown_others_delay):
+            return
+
+        self.poll_interval = poll_interval
+        self.shutdown_pi5_01_delay = priority_delay
+        self.shutdown_others_delay = secondary_delay
+        self._cache_ttl = max(1, self.poll_interval // 3)
+        self._phases = self._build_phases()
+        self._update_next_phase()
+        logger.info(f"Reloaded config: poll interval {poll_interval}s, "
+                    f"priority delay {priority_delay}s, secondary delay {secondary_delay}s")
+
+    def _parse_nodes(self, value: str) -> tuple:
+        """Parse a comma-separated node list, dropping blanks and the critical node."""
+        return tuple(n for n in (s.strip() for s in value.split(',')) if n and n != self.critical_node)
+
+    @staticmethod
+    def _internal_ip(node) -> Optional[str]:
+        return next((a.address for a in node.status.addresses if a.type == 'InternalIP'), None)
+
+    def _refresh_node_cache(self):
+        """Cache node InternalIPs with a single list_node call."""
+        try:
+            nodes = self.k8s_core.list_node()
+            self._node_ip_cache = {n.metadata.name: self._internal_ip(n) for n in nodes.items}
+        except Exception as e:
+            logger.error(f"Failed to refresh node IP cache: {e}")
+
+    def _lookup_single(self, node_name: str) -> Optional[str]:
+        """Look up a node IP missing from the cache."""
+        node_ip = self._internal_ip(self.k8s_core.read_node(node_name))
+        self._node_ip_cache[node_name] = node_ip
+        return node_ip
+
     def get_power_status(self) -> Optional[dict]:
         """Query Home Assistant for power sensor status."""
+        now = time.monotonic()
+        fetched_at, cached = self._power_cache
+        if cached is not None and now - fetched_at < self._cache_ttl:
+            return cached
+
         try:
-            headers = {
-                'Authorization': f'Bearer {self.ha_token}',
-                'Content-Type': 'application/json',
-            }
-            url = f'{self.ha_url}/api/states/{self.power_sensor}'
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self._session.get(self._state_url, timeout=(3.05, 10))
             response.raise_for_status()
-            return response.json()
+            result = response.json()
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to query Home Assistant: {e}")
             return None
 
+        self._power_cache = (now, result)
+        return result
+
+    def invalidate(self):
+        """Drop the cached REST reading so the next query hits Home Assistant."""
+        self._power_cache = (0.0, None)
+
+    def get_sensor_data(self) -> tuple:
+        """Return (sensor_data, fresh) from the latest push, falling back to REST when it can't be trusted.
+
+        A pushed state is only fresh, i.e. worth counting as a new reading, when
+        it is a new push or has been held for most of a poll interval since it
+        was last counted, so quick re-polls can't count one push several times.
+        """
+        now = time.monotonic()
+        # A live connection answers a ping at least every poll interval
+        ws_alive = self._ws_connected and now - self._ws_alive_at < self.poll_interval * 2
+        sensor_data, seq = self._ws_sensor, self._ws_seq
+        if ws_alive and sensor_data is not None:
+            counted_seq, counted_at = self._ws_counted
+            fresh = seq != counted_seq or now - counted_at >= self.poll_interval * 0.8
+            if fresh:
+                self._ws_counted = (seq, now)
+            return sensor_data, fresh
+        return self.get_power_status(), True
+
+    def _fetch_seed_state(self) -> Optional[dict]:
+        """One-off REST read for the WebSocket thread; the shared session and cache belong to the main loop."""
+        try:
+            response = requests.get(self._state_url, headers=self._ws_headers, timeout=(3.05, 10))
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to seed sensor state for WebSocket: {e}")
+            return None
+
+    def watch_sensor(self):
+        """Subscribe to power sensor state changes over the Home Assistant WebSocket API."""
+        while True:
+            ws = None
+            try:
+                ws = websocket.create_connection(self._ws_url, timeout=10)
+                ws.recv()  # auth_required
+                ws.send(json.dumps({'type': 'auth', 'access_token': self.ha_token}))
+                auth = json.loads(ws.recv())
+                if auth.get('type') != 'auth_ok':
+                    raise RuntimeError(f"authentication failed: {auth.get('message', auth.get('type'))}")
+
+                msg_id = 1
+                ws.send(json.dumps({
+                    'id': msg_id,
+                    'type': 'subscribe_trigger',
+                    'trigger': {'platform': 'state', 'entity_id': self.power_sensor},
+                }))
+                # Seed with the current state; events queued meanwhile overwrite it
+                self._ws_sensor = self._fetch_seed_state()
+                self._ws_seq += 1
+                self._ws_alive_at = time.monotonic()
+                self._ws_connected = True
+                logger.info(f"Subscribed to {self.power_sensor} state changes via WebSocket")
+
+                pending_ping = None
+                while True:
+                    # Re-read each time so a reloaded poll interval applies to the
+                    # ping cadence that get_sensor_data's liveness check expects
+                    ws.settimeout(self.poll_interval)
+                    try:
+                        msg = json.loads(ws.recv())
+                    except websocket.WebSocketTimeoutException:
+                        # A ping unanswered for a whole poll interval means the
+                        # connection is dead, even if sends still succeed
+                        if pending_ping is not None:
+                            raise RuntimeError("no pong received, connection is dead")
+                        msg_id += 1
+                        pending_ping = msg_id
+                        ws.send(json.dumps({'id': msg_id, 'type': 'ping'}))
+                        continue
+
+                    self._ws_alive_at = time.monotonic()
+                    if msg.get('type') == 'pong':
+                        if msg.get('id') == pending_ping:
+                            pending_ping = None
+                        continue
+                    if msg.get('type') == 'result' and not msg.get('success'):
+                        raise RuntimeError(f"subscription failed: {msg.get('error')}")
+                    if msg.get('type') != 'event':
+                        continue
+
+                    self._ws_sensor = msg['event']['variables']['trigger']['to_state']
+                    self._ws_seq += 1
+                    self._sensor_changed.set()
+            except Exception as e:
+                logger.warning(f"Home Assistant WebSocket unavailable, falling back to REST: {e}")
+            finally:
+                self._ws_connected = False
+                if ws:
+                    ws.close()
+
+            time.sleep(self.poll_interval)
+
     def is_power_available(self, sensor_data: dict) -> bool:
         """Check if AC power is available based on sensor state."""
         # Test mode: simulate power outage
@@ -92,23 +434,53 @@ class PowerMonitor:
         if not sensor_data:
             return False
 
-        state = sensor_data.get('state', '').lower()
+        state = sensor_data.get('state')
+        if state is None:
+            return False
 
         # If sensor is unavailable or unknown, power is likely out
-        if state in ['unavailable', 'unknown', 'none']:
+        state = state.strip().lower()
+        if state in _BAD_STATES:
             return False
 
         # If we can read power value and it's > 0, power is available
         try:
-            power = float(state)
-            return power > 0  # Any power reading means plug is online
-        except (ValueError, TypeError):
+            return float(state) > 0  # Any power reading means plug is online
+        except ValueError:
             return False
 
+    def _record_reading(self, power_available: bool) -> int:
+        """Shift a reading into the 4-poll window; returns how many in it are "out"."""
+        self._out_bits = ((self._out_bits << 1) | (not power_available)) & 0xF
+        self._bits_seen = min(self._bits_seen + 1, 4)
+        self._reading_times = (self._reading_times + [time.monotonic()])[-4:]
+        return self._out_bits.bit_count()
+
+    def confirm_power_state(self, power_available: bool) -> bool:
+        """Debounce readings: the power state only flips on 3 of the last 4 polls."""
+        out_count = self._record_reading(power_available)
+
+        if self._outage_start_mono is None:
+            if out_count >= 3:
+                # The outage began at the oldest "out" reading still in the window
+                self._first_out_at = next(
+                    self._reading_times[-(bit + 1)]
+                    for bit in range(self._bits_seen - 1, -1, -1)
+                    if self._out_bits >> bit & 1
+                )
+                return False
+            if not power_available:
+                logger.warning(f"⚠️  Power reading out ({out_count}/4), waiting for confirmation")
+                self.invalidate()
+            return True
+
+        return self._bits_seen - out_count >= 3
+
     def cordon_node(self, node_name: str) -> bool:
         """Mark node as unschedulable."""
         if self.dry_run:
             logger.info(f"[DRY RUN] Would cordon node: {node_name}")
+            self.nodes_cordoned.add(node_name)
             return True
 
         try:
@@ -117,7 +489,9 @@ class PowerMonitor:
                     "unschedulable": True
                 }
             }
-            self.k8s_core.patch_node(node_name, body)
+            with self._cordon_sem:
+                self.k8s_core.patch_node(node_name, body)
+            self.nodes_cordoned.add(node_name)
             logger.info(f"✓ Cordoned node: {node_name}")
             return True
         except Exception as e:
@@ -137,34 +511,71 @@ class PowerMonitor:
                 }
             }
             self.k8s_core.patch_node(node_name, body)
+            self.nodes_cordoned.discard(node_name)
             logger.info(f"✓ Uncordoned node: {node_name}")
             return True
         except Exception as e:
             logger.error(f"Failed to uncordon node {node_name}: {e}")
             return False
 
+    def _evictable_pods(self, node_name: str) -> list:
+        """Pods on a node that a drain should evict (skips DaemonSet and mirror pods)."""
+        pods = self.k8s_core.list_pod_for_all_namespaces(field_selector=f'spec.nodeName={node_name}')
+        evictable = []
+        for pod in pods.items:
+            if any(owner.kind == 'DaemonSet' for owner in pod.metadata.owner_references or []):
+                continue
+            if 'kubernetes.io/config.mirror' in (pod.metadata.annotations or {}):
+                continue
+            evictable.append(pod)
+        return evictable
+
+    def _evict_pod(self, pod, deadline: float) -> bool:
+        """Evict a pod, backing off while a PodDisruptionBudget blocks it."""
+        name, namespace = pod.metadata.name, pod.metadata.namespace
+        body = client.V1Eviction(
+            metadata=client.V1ObjectMeta(name=name, namespace=namespace),
+            delete_options=client.V1DeleteOptions(grace_period_seconds=30),
+        )
+        delay = 1
+        while True:
+            try:
+                self.k8s_core.create_namespaced_pod_eviction(name=name, namespace=namespace, body=body)
+                return True
+            except ApiException as e:
+                if e.status == 404:  # Already gone
+                    return True
+                if e.status != 429 or time.monotonic() + delay > deadline:
+                    logger.error(f"Failed to evict pod {namespace}/{name}: {e.status} {e.reason}")
+                    return False
+            time.sleep(delay)
+            delay = min(delay * 2, 16)
+
     def drain_node(self, node_name: str) -> bool:
-        """Drain pods from node using kubectl."""
+        """Drain pods from node using the Eviction API."""
         if self.dry_run:
             logger.info(f"[DRY RUN] Would drain node: {node_name}")
             return True
 
+        deadline = time.monotonic() + 120
         try:
-            cmd = [
-                'kubectl', 'drain', node_name,
-                '--ignore-daemonsets',
-                '--delete-emptydir-data',
-                '--force',
-                '--grace-period=30',
-                '--timeout=120s'
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=180)
-            if result.returncode == 0:
-                logger.info(f"✓ Drained node: {node_name}")
-                return True
-            else:
-                logger.error(f"Failed to drain node {node_name}: {result.stderr}")
-                return False
+            with self._drain_sem:
+                pods = self._evictable_pods(node_name)
+                with ThreadPoolExecutor(max_workers=10, thread_name_prefix='evict') as pool:
+                    evicted = all(pool.map(lambda pod: self._evict_pod(pod, deadline), pods))
+                if not evicted:
+                    logger.error(f"Failed to drain node {node_name}: some pods could not be evicted")
+                    return False
+
+                # Wait for evicted pods to terminate
+                while self._evictable_pods(node_name):
+                    if time.monotonic() >= deadline:
+                        logger.error(f"Failed to drain node {node_name}: timed out waiting for pods to terminate")
+                        return False
+                    time.sleep(2)
+
+            logger.info(f"✓ Drained node: {node_name}")
+            return True
         except Exception as e:
             logger.error(f"Exception draining node {node_name}: {e}")
             return False
@@ -178,13 +589,8 @@ class PowerMonitor:
             return True
 
         try:
-            # Get node IP from Kubernetes
-            node = self.k8s_core.read_node(node_name)
-            node_ip = None
-            for address in node.status.addresses:
-                if address.type == 'InternalIP':
-                    node_ip = address.address
-                    break
+            # Get node IP from the cache, falling back to Kubernetes
+            node_ip = self._node_ip_cache.get(node_name) or self._lookup_single(node_name)
 
             if not node_ip:
                 logger.error(f"Could not find IP for node {node_name}")
@@ -208,94 +614,138 @@ class PowerMonitor:
             logger.error(f"Failed to shutdown node {node_name}: {e}")
             return False
 
+    def _targets(self, nodes: tuple) -> list:
+        """Nodes from a configured list that have not been shut down yet."""
+        return [node for node in nodes if node not in self.nodes_shutdown]
+
+    def _run_parallel(self, operation, nodes: list) -> list:
+        """Run a node operation concurrently across nodes and wait for all of them."""
+        return list(self._exec.map(operation, nodes))
+
+    def _run_op(self, op: str, nodes: tuple, description: str) -> bool:
+        """Run one shutdown phase; returns True if every node operation succeeded."""
+        targets = self._targets(nodes)
+        if not targets:
+            return True
+
+        level = logging.WARNING if op == 'shutdown' else logging.INFO
+        logger.log(level, f"{'🔌' if op == 'shutdown' else '⚡'} {description}: {targets}")
+
+        results = []
+        if op in ('cordon', 'cordon_drain'):
+            # Cordon every node before draining any, so evicted pods can't
+            # be rescheduled onto another node that is about to go
+            results += self._run_parallel(self.cordon_node, [n for n in targets if n not in self.nodes_cordoned])
+        if op in ('drain', 'cordon_drain'):
+            results += self._run_parallel(self.drain_node, targets)
+        if op == 'shutdown':
+            results += self._run_parallel(self.shutdown_node, targets)
+        return all(results)
+
     def execute_shutdown_sequence(self, elapsed_time: float):
         """Execute phased shutdown based on elapsed outage time."""
-
-        # Phase 1: Shutdown priority nodes (pi5-01 with hard drive)
-        if elapsed_time >= 30 and not self.shutdown_initiated:
-            logger.warning(f"⚡ Phase 1: Shutting down priority nodes")
+        for threshold, phase, op, nodes, description in self._phases:
+            if elapsed_time < threshold:
+                break
+            if phase in self._fired:
+                continue
             self.shutdown_initiated = True
-
-            for node in self.priority_shutdown_nodes:
-                node = node.strip()
-                if node == self.critical_node:
-                    continue
-                logger.info(f"Processing priority node: {node}")
-                self.cordon_node(node)
-
-        # Phase 2: Drain priority nodes
-        if elapsed_time >= 60:
-            for node in self.priority_shutdown_nodes:
-                node = node.strip()
-                if node == self.critical_node or node in self.nodes_shutdown:
-                    continue
-                logger.info(f"Draining priority node: {node}")
-                self.drain_node(node)
-
-        # Phase 3: Shutdown priority nodes
-        if elapsed_time >= self.shutdown_pi5_01_delay:
-            for node in self.priority_shutdown_nodes:
-                node = node.strip()
-                if node == self.critical_node or node in self.nodes_shutdown:
-                    continue
-                logger.warning(f"🔌 Shutting down priority node: {node}")
-                self.shutdown_node(node)
-
-        # Phase 4: Cordon and drain secondary nodes
-        if elapsed_time >= 300:  # 5 minutes
-            for node in self.secondary_shutdown_nodes:
-                node = node.strip()
-                if node == self.critical_node or node in self.nodes_shutdown:
-                    continue
-                logger.info(f"Processing secondary node: {node}")
-                self.cordon_node(node)
-                self.drain_node(node)
-
-        # Phase 5: Shutdown secondary nodes
-        if elapsed_time >= self.shutdown_others_delay:
-            for node in self.secondary_shutdown_nodes:
-                node = node.strip()
-                if node == self.critical_node or node in self.nodes_shutdown:
-                    continue
-                logger.warning(f"🔌 Shutting down secondary node: {node}")
-                self.shutdown_node(node)
+            if self._run_op(op, nodes, description):
+                self._fired.add(phase)
+
+        self._update_next_phase()
+        self._persist()
+
+    def _update_next_phase(self):
+        """Track the earliest threshold of a phase that has not completed yet."""
+        # Failed phases stay unfired and are retried on the next poll
+        self._next_phase_at = next(
+            (threshold for threshold, phase, *_ in self._phases if phase not in self._fired),
+            float('inf'),
+        )
+
+    @staticmethod
+    def _is_ready(node) -> bool:
+        return any(c.type == 'Ready' and c.status == 'True' for c in node.status.conditions or [])
+
+    @staticmethod
+    def _ready_since(node, since: datetime) -> bool:
+        """Whether the kubelet has reported Ready since the given time."""
+        for c in node.status.conditions or []:
+            if c.type == 'Ready' and c.status == 'True':
+                return any(t is not None and t > since for t in (c.last_transition_time, c.last_heartbeat_time))
+        return False
 
     def restore_power_procedures(self):
         """Execute procedures when power is restored."""
         logger.info("🔋 Power restored! Initiating recovery procedures...")
-
-        # Wait a bit for nodes to boot up
-        logger.info("Waiting 60 seconds for nodes to boot...")
-        time.sleep(60)
-
-        # Check which nodes are back online and uncordon them
+        self._refresh_node_cache()
+
+        # Watch nodes and uncordon each one as soon as it is genuinely back
+        logger.info("Waiting up to 120 seconds for nodes to boot...")
+        restore_started = datetime.now(timezone.utc)
+        really_shutdown = self.nodes_shutdown if not (self.dry_run or self.skip_shutdown) else set()
+        target = self.nodes_shutdown | self.nodes_cordoned
+        seen_not_ready = set()
+        uncordons = []
+        deadline = time.monotonic() + 120
+        power_lost = False
         try:
-            nodes = self.k8s_core.list_node()
-            for node in nodes.items:
-                node_name = node.metadata.name
-
-                # Skip the critical node (it never shut down)
-                if node_name == self.critical_node:
-                    continue
-
-                # Check if node is ready
-                is_ready = False
-                for condition in node.status.conditions:
-                    if condition.type == 'Ready' and condition.status == 'True':
-                        is_ready = True
+            while target and time.monotonic() < deadline:
+                # Watch in short windows so a new power loss is noticed mid-recovery,
+                # debounced like the main loop so one HA blip can't abandon the wait
+                sensor_data, fresh = self.get_sensor_data()
+                if fresh and self._record_reading(self.is_power_available(sensor_data)) >= 3:
+                    logger.warning("⚠️  Power lost again during recovery, abandoning wait")
+                    power_lost = True
+                    break
+
+                w = watch.Watch()
+                window = max(1, min(self.poll_interval, int(deadline - time.monotonic())))
+                for event in w.stream(self.k8s_core.list_node, timeout_seconds=window):
+                    node = event['object']
+                    node_name = node.metadata.name
+                    if node_name not in target:
+                        continue
+                    if not self._is_ready(node):
+                        seen_not_ready.add(node_name)
+                        continue
+
+                    # A node halted within the node-monitor grace period still
+                    # reports its cached Ready status, so require fresh evidence
+                    if (node_name in really_shutdown and node_name not in seen_not_ready
+                            and not self._ready_since(node, restore_started)):
+                        continue
+
+                    target.discard(node_name)
+                    if node.spec.unschedulable:
+                        logger.info(f"Node {node_name} is back online, uncordoning...")
+                        uncordons.append(self._exec.submit(self.uncordon_node, node_name))
+                    if not target:
+                        w.stop()
                         break
 
-                # If node is ready and was shut down, uncordon it
-                if is_ready and node.spec.unschedulable:
-                    logger.info(f"Node {node_name} is back online, uncordoning...")
-                    self.uncordon_node(node_name)
+            for future in uncordons:
+                future.result()
+            if target:
+                logger.warning(f"Nodes not back online, left cordoned: {sorted(target)}")
         except Exception as e:
             logger.error(f"Error during power restoration: {e}")
 
-        # Reset state
-        self.power_outage_start = None
-        self.shutdown_initiated = False
-        self.nodes_shutdown.clear()
+        # Start a fresh outage timeline, but keep tracking nodes that didn't come
+        # back so a later recovery still uncordons them
+        leftover_shutdown = self.nodes_shutdown & target
+        leftover_cordoned = self.nodes_cordoned & target
+        window = (self._out_bits, self._bits_seen, self._reading_times)
+        self._reset_state()
+        if power_lost:
+            # Keep the readings that showed the new outage, so the main loop
+            # confirms it straight away and times it from the first of them
+            self._out_bits, self._bits_seen, self._reading_times = window
+        if leftover_shutdown or leftover_cordoned:
+            self.nodes_shutdown |= leftover_shutdown
+            self.nodes_cordoned |= leftover_cordoned
+            self._persist()
         logger.info("✓ Recovery procedures complete")
 
     def run(self):
@@ -331,56 +781,80 @@ class PowerMonitor:
             logger.warning("Testing all functions without restrictions")
             logger.warning("=" * 60)
 
-        while True:
-            try:
-                # Query power status
-                sensor_data = self.get_power_status()
-                power_available = self.is_power_available(sensor_data)
-
-                if power_available:
-                    # Power is available
-                    if self.power_outage_start:
-                        # Power was out, now restored
-                        outage_duration = (datetime.now() - self.power_outage_start).total_seconds()
-                        logger.info(f"✓ Power restored after {outage_duration:.0f}s outage")
-
-                        # Only run restoration if we actually shut down nodes
-                        if self.shutdown_initiated or self.nodes_shutdown:
-                            self.restore_power_procedures()
-                        else:
-                            # Just reset state
-                            self.power_outage_start = None
-                            self.shutdown_initiated = False
-
-                    # All is well, log periodically
-                    if int(time.time()) % 300 == 0:  # Every 5 minutes
-                        state = sensor_data.get('state', 'unknown') if sensor_data else 'error'
-                        logger.info(f"✓ Power OK - {self.power_sensor}: {state}W")
-
-                else:
-                    # Power is OUT
-                    if not self.power_outage_start:
-                        # New outage detected
-                        self.power_outage_start = datetime.now()
-                        logger.warning(f"⚠️  POWER OUTAGE DETECTED! Running on UPS battery")
-                        logger.warning(f"⚠️  Sensor state: {sensor_data.get('state') if sensor_data else 'unavailable'}")
-
-                    # Calculate elapsed outage time
-                    elapsed = (datetime.now() - self.power_outage_start).total_seconds()
-                    logger.warning(f"⚠️  Power outage: {elapsed:.0f}s elapsed")
-
-                    # Execute shutdown sequence
-                    self.execute_shutdown_sequence(elapsed)
-
-                # Sleep until next poll
-                time.sleep(self.poll_interval)
-
-            except KeyboardInterrupt:
-                logger.info("Shutting down power monitor...")
-                break
-            except Exception as e:
-                logger.error(f"Unexpected error in main loop: {e}", exc_info=True)
-                time.sleep(self.poll_interval)
+        threading.Thread(target=self.watch_sensor, name='ha-websocket', daemon=True).start()
+
+        # Catch Ctrl-C around the whole loop, since it mostly arrives mid-wait
+        try:
+            while True:
+                deadline = time.monotonic() + self.poll_interval
+                try:
+                    self.reload_config()
+
+                    # Query power status
+                    self._sensor_changed.clear()
+                    sensor_data, fresh = self.get_sensor_data()
+                    reading = self.is_power_available(sensor_data)
+                    if fresh:
+                        power_available = self.confirm_power_state(reading)
+                    else:
+                        # Same push as last time: nothing new to count, keep the current state
+                        power_available = self._outage_start_mono is None
+
+                    # Power looks back mid-outage: re-check sooner so restoration is
+                    # confirmed in seconds rather than several poll intervals
+                    if reading and not power_available:
+                        deadline = min(deadline, time.monotonic() + self._restore_recheck)
+                        self.invalidate()
+
+                    if power_available:
+                        # Power is available
+                        if self._outage_start_mono is not None:
+                            # Power was out, now restored
+                            outage_duration = time.monotonic() - self._outage_start_mono
+                            logger.info(f"✓ Power restored after {outage_duration:.0f}s outage")
+
+                            # Only run restoration if we actually shut down nodes
+                            if self.shutdown_initiated or self.nodes_shutdown or self.nodes_cordoned:
+                                self.restore_power_procedures()
+                            else:
+                                # Just reset state
+                                self._reset_state()
+
+                        # All is well, log periodically
+                        now = time.monotonic()
+                        if now >= self._next_ok_log:
+                            state = sensor_data.get('state', 'unknown') if sensor_data else 'error'
+                            logger.info(f"✓ Power OK - {self.power_sensor}: {state}W")
+                            self._next_ok_log = now + 300  # Every 5 minutes
+
+                    else:
+                        # Power is OUT
+                        if self._outage_start_mono is None:
+                            # New outage detected, timed from its first "out" reading so
+                            # the debounce doesn't eat into the UPS battery budget
+                            self._outage_start_mono = self._first_out_at
+                            self._outage_start_wall = datetime.now() - timedelta(seconds=time.monotonic() - self._first_out_at)
+                            self._persist()
+                            logger.warning(f"⚠️  POWER OUTAGE DETECTED! Running on UPS battery")
+                            logger.warning(f"⚠️  Sensor state: {sensor_data.get('state') if sensor_data else 'unavailable'}")
+
+                        # Calculate elapsed outage time
+                        elapsed = time.monotonic() - self._outage_start_mono
+                        logger.warning(f"⚠️  Power outage: {elapsed:.0f}s elapsed")
+
+                        # Execute shutdown sequence
+                        if elapsed >= self._next_phase_at:
+                            self.execute_shutdown_sequence(elapsed)
+
+                except Exception as e:
+                    logger.error(f"Unexpected error in main loop: {e}", exc_info=True)
+
+                # Sleep until the next poll deadline, waking early on a pushed state change
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._sensor_changed.wait(remaining)
+        except KeyboardInterrupt:
+            logger.info("Shutting down power monitor...")
 
 if __name__ == '__main__':
     monitor = PowerMonitor()